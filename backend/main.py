@@ -15,21 +15,34 @@ Run backend (Windows PowerShell):
 5) copy .env.example .env   (then edit .env)
 6) uvicorn main:app --reload --port 8000
 
+Or start a single local worker without --reload:
+  python main.py   (UVICORN_WORKERS=N for more workers)
+
+Production (Linux/macOS, uses uvloop + httptools from uvicorn[standard]):
+  uvicorn main:app --loop uvloop --http httptools --workers $(nproc) --port 8000
+  Each worker keeps its own quiz cache and OpenAI connection pool.
+
 Then run frontend with Live Server:
 - Open frontend/index.html with Live Server
 """
 
 from __future__ import annotations
 
-import json
+import asyncio
+import itertools
+import math
 import os
 import random
-from typing import List, Literal
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Literal, Sequence
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, conint
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, conint
 
 # Load env variables from .env
 load_dotenv()
@@ -41,12 +54,57 @@ Difficulty = Literal["easy", "medium", "hard"]
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini").strip()
+# Quiz cache (off by default): a hit returns the same questions with reshuffled
+# options, so "Create New Quiz" on the same topic would not get new questions
+QUIZ_CACHE_SIZE = int(os.getenv("QUIZ_CACHE_SIZE", "0"))
+QUIZ_CACHE_TTL = float(os.getenv("QUIZ_CACHE_TTL", "600"))  # seconds
+# Comma-separated origins allowed to call the API; "*" is meant for local dev
+CORS_ALLOW_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ALLOW_ORIGINS", "*").split(",")
+    if origin.strip()
+]
 
 # OpenAI SDK (optional, only required if using LLM)
 try:
-    from openai import OpenAI
+    import httpx
+    from openai import APIError, AsyncOpenAI, DefaultAsyncHttpxClient
+
+    # SDK errors, plus transport errors that can surface while reading a stream
+    OPENAI_ERRORS: tuple = (APIError, httpx.HTTPError)
 except Exception:
-    OpenAI = None  # type: ignore
+    AsyncOpenAI = None  # type: ignore
+    OPENAI_ERRORS = ()
+
+# One shared client for the whole process so its connection pool stays warm.
+# HTTP/2 multiplexes the concurrent shard requests over a single TLS connection.
+_client = (
+    AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        timeout=30.0,
+        http_client=DefaultAsyncHttpxClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        ),
+    )
+    if AsyncOpenAI is not None and OPENAI_API_KEY
+    else None
+)
+
+
+def get_client() -> AsyncOpenAI:
+    """
+    Returns the shared OpenAI client, or raises if the backend is not configured.
+    """
+    if AsyncOpenAI is None:
+        raise RuntimeError("OpenAI library not available.")
+    if _client is None:
+        raise RuntimeError("OPENAI_API_KEY not set.")
+    return _client
+
+
+# Larger quizzes are split into parallel OpenAI calls of about this many questions
+SHARD_SIZE = 4
 
 
 # -----------------------------
@@ -71,41 +129,90 @@ class QuizResponse(BaseModel):
     questions: List[QuizQuestion]
 
 
+# Compiled once; validate_json parses + validates the raw OpenAI reply in one
+# pydantic-core call with no intermediate dict.
+_QUIZ_ADAPTER = TypeAdapter(QuizResponse)
+
+
+# All 24 orderings of the 4 options, so a shuffle is a single table pick
+_OPTION_PERMUTATIONS = tuple(itertools.permutations(range(4)))
+
+
 def shuffle_question_options(question: QuizQuestion) -> QuizQuestion:
     """
     Randomly permute the options while keeping track of which one is correct.
     """
-    indices = list(range(len(question.options)))
-    random.shuffle(indices)
-
-    target_index = (
-        question.answer_index
-        if 0 <= question.answer_index < len(question.options)
-        else 0
-    )
-
-    reordered_options = [question.options[i] for i in indices]
-    new_answer_index = indices.index(target_index)
+    perm = random.choice(_OPTION_PERMUTATIONS)
 
     return QuizQuestion(
         question=question.question,
-        options=reordered_options,
-        answer_index=new_answer_index,
+        options=[question.options[i] for i in perm],
+        answer_index=perm.index(question.answer_index),
         explanation=question.explanation,
     )
 
+# -----------------------------
+# Quiz cache
+# -----------------------------
+# Exact-match LRU keyed by (topic, difficulty, count), with entries expiring
+# after QUIZ_CACHE_TTL seconds. Entries are stored as (expires_at, JSON) so a
+# cached quiz can never be mutated after the fact.
+_quiz_cache: OrderedDict[tuple[str, str, int], tuple[float, str]] = OrderedDict()
+
+# Generations in flight, so identical concurrent misses share one OpenAI call
+_quiz_inflight: dict[tuple[str, str, int], asyncio.Task] = {}
+
+
+def quiz_cache_key(topic: str, difficulty: Difficulty, count: int) -> tuple[str, str, int]:
+    return (topic.lower().strip(), difficulty, count)
+
+
+def quiz_cache_get(key: tuple[str, str, int]) -> QuizResponse | None:
+    entry = _quiz_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, cached = entry
+    if expires_at <= time.monotonic():
+        del _quiz_cache[key]
+        return None
+    _quiz_cache.move_to_end(key)
+    return _QUIZ_ADAPTER.validate_json(cached)
+
+
+def quiz_cache_put(key: tuple[str, str, int], quiz: QuizResponse) -> None:
+    _quiz_cache[key] = (time.monotonic() + QUIZ_CACHE_TTL, quiz.model_dump_json())
+    _quiz_cache.move_to_end(key)
+    while len(_quiz_cache) > QUIZ_CACHE_SIZE:
+        _quiz_cache.popitem(last=False)
+
+
 # -----------------------------
 # FastAPI app
 # -----------------------------
-app = FastAPI(title="Quiz AI Backend", version="1.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release the pooled OpenAI connections on shutdown
+    if _client is not None:
+        await _client.close()
+
+
+app = FastAPI(
+    title="Quiz AI Backend",
+    version="1.1.0",
+    lifespan=lifespan,
+)
 
-# Dev-friendly CORS so Live Server can call backend
+# Dev-friendly CORS so Live Server can call backend.
+# Credentials are only allowed for explicit origins: with "*" they force the
+# Origin to be echoed on every response. max_age lets browsers cache preflights.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # dev only (tighten later)
-    allow_credentials=True,
+    allow_origins=CORS_ALLOW_ORIGINS,
+    allow_credentials="*" not in CORS_ALLOW_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=86400,
 )
 
 
@@ -118,6 +225,59 @@ def health():
     return {"status": "ok", "mock": False, "model": OPENAI_MODEL, "mode": "ai"}
 
 
+# -----------------------------
+# Streamed JSON scanning
+# -----------------------------
+# Only these characters can change brace depth or string state; everything
+# else is skipped by the regex engine instead of a Python loop.
+_JSON_STRUCTURAL = re.compile(r'[{}"\\]')
+
+
+class JsonObjectScanner:
+    """
+    Tracks brace depth across streamed chunks, ignoring braces inside strings,
+    so we can tell when the top-level JSON object has been fully received.
+    """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False  # chunk ended right after a backslash
+
+    def feed(self, chunk: str) -> int:
+        """
+        Returns the offset just past the closing top-level brace, or -1 if the
+        object is still open after this chunk.
+        """
+        # Position of the character escaped by a preceding backslash
+        skip_at = 0 if self.escaped else -1
+
+        for match in _JSON_STRUCTURAL.finditer(chunk):
+            pos = match.start()
+            if pos == skip_at:
+                continue
+            ch = match.group()
+
+            if self.in_string:
+                if ch == "\\":
+                    skip_at = pos + 1
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+                self.started = True
+            elif ch == "}":
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    return pos + 1
+
+        self.escaped = skip_at == len(chunk)
+        return -1
+
+
 # -----------------------------
 # OpenAI quiz generator
 # -----------------------------
@@ -128,19 +288,40 @@ SYSTEM_PROMPT = (
 )
 
 
-def build_user_prompt(topic: str, difficulty: Difficulty, count: int) -> str:
+def build_user_prompt(
+    topic: str,
+    difficulty: Difficulty,
+    count: int,
+    part: int = 1,
+    parts: int = 1,
+    avoid: Sequence[str] = (),
+) -> str:
     """
     We describe the exact JSON contract we want back.
     NOTE: We avoid using ["A","B","C","D"] so the model does not literally output A/B/C/D.
+    Shards of a larger quiz each get their own sub-area (part of parts), and
+    `avoid` lists questions we already have so replacements do not repeat them.
     """
-    return f"""
+    scope = ""
+    if parts > 1:
+        scope += (
+            f"- This is part {part} of {parts} of a larger quiz: split the topic into "
+            f"{parts} distinct sub-areas and only ask about sub-area {part}, "
+            "so no question overlaps with the other parts.\n"
+        )
+    if avoid:
+        scope += "- Do not repeat or rephrase any of these questions:\n"
+        scope += "".join(f"  - {q}\n" for q in avoid)
+
+    # Starts and ends on the text itself, so the result needs no .strip()
+    return f"""\
 Create a multiple-choice quiz.
 
 Constraints:
 - Topic: {topic}
 - Difficulty: {difficulty}
 - Number of questions: {count}
-- Each question must have exactly 4 options.
+{scope}- Each question must have exactly 4 options.
 - Exactly one correct option.
 - Avoid trick questions.
 - Explanations must explain WHY in 1–2 sentences.
@@ -164,59 +345,173 @@ Return JSON with this exact shape:
 Rules:
 - answer_index must be 0,1,2, or 3 and should be distributed so the correct option is not stuck at index 0.
 - options must be 4 short strings
-- Keep questions unambiguous
-""".strip()
+- Keep questions unambiguous"""
 
 
-def call_openai_quiz(topic: str, difficulty: Difficulty, count: int) -> QuizResponse:
+async def request_quiz_shard(
+    topic: str,
+    difficulty: Difficulty,
+    count: int,
+    part: int = 1,
+    parts: int = 1,
+    avoid: Sequence[str] = (),
+) -> QuizResponse:
     """
-    Calls OpenAI and enforces JSON output.
+    Calls OpenAI once and enforces JSON output.
     Uses response_format=json_object to reduce 'invalid JSON' responses.
+    The reply is streamed and scanned as it arrives so we can hand it to the
+    decoder the moment the JSON object is complete.
     """
-    if OpenAI is None:
-        raise RuntimeError("OpenAI library not available.")
-    if not OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY not set.")
-
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = get_client()
+    scanner = JsonObjectScanner()
+    received: List[str] = []
 
     try:
-        resp = client.chat.completions.create(
+        stream = await client.chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": build_user_prompt(topic, difficulty, count)},
+                {
+                    "role": "user",
+                    "content": build_user_prompt(topic, difficulty, count, part, parts, avoid),
+                },
             ],
             temperature=0.4,
             # IMPORTANT: Ask the model to return strict JSON.
             response_format={"type": "json_object"},
+            stream=True,
         )
-    except Exception as e:
+        try:
+            # Stop reading as soon as the top-level object closes
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                delta = chunk.choices[0].delta.content
+                end = scanner.feed(delta)
+                if end >= 0:
+                    received.append(delta[:end])
+                    break
+                received.append(delta)
+        finally:
+            await stream.close()
+    except OPENAI_ERRORS as e:
         # Network issues, auth issues, model issues, etc.
         raise RuntimeError(f"OpenAI request failed: {e}")
 
-    content = (resp.choices[0].message.content or "").strip()
+    # No .strip(): the JSON parser skips surrounding whitespace itself
+    content = "".join(received)
 
-    # Parse JSON
+    # Parse JSON + validate schema
     try:
-        data = json.loads(content)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"AI returned invalid JSON: {e}")
-
-    # Validate schema
-    try:
-        quiz = QuizResponse.model_validate(data)
-    except Exception as e:
+        quiz = _QUIZ_ADAPTER.validate_json(content)
+    except ValidationError as e:
+        if any(err["type"] == "json_invalid" for err in e.errors()):
+            raise ValueError(f"AI returned invalid JSON: {e}")
         raise ValueError(f"AI JSON did not match schema: {e}")
 
-    # Extra sanity checks
+    # Extra sanity check (option count is already enforced by QuizQuestion)
     if len(quiz.questions) != count:
         raise ValueError(f"Expected {count} questions but got {len(quiz.questions)}.")
 
-    # Ensure each question has exactly 4 options (pydantic enforces, but keep it explicit)
-    for i, q in enumerate(quiz.questions):
-        if len(q.options) != 4:
-            raise ValueError(f"Question {i+1} has {len(q.options)} options (expected 4).")
+    return quiz
+
+
+def question_key(question: QuizQuestion) -> str:
+    """
+    Normalizes question text so trivially different duplicates compare equal.
+    """
+    return " ".join(question.question.lower().split())
+
+
+def add_unique_questions(
+    questions: List[QuizQuestion], new: List[QuizQuestion], seen: set[str]
+) -> None:
+    for q in new:
+        key = question_key(q)
+        if key not in seen:
+            seen.add(key)
+            questions.append(q)
+
+
+async def generate_quiz_questions(topic: str, difficulty: Difficulty, count: int) -> QuizResponse:
+    """
+    Generates the quiz with one OpenAI call per shard of ~SHARD_SIZE questions.
+    Shards run concurrently, so a 15-question quiz costs about one 4-question round-trip.
+    Each shard covers its own sub-area of the topic; any duplicates that still
+    slip through are dropped and replaced by one follow-up call.
+    """
+    # Fail fast before fanning out shards
+    get_client()
+
+    # Spread the questions as evenly as possible, e.g. 15 -> [4, 4, 4, 3]
+    shards = math.ceil(count / SHARD_SIZE)
+    sizes = [count // shards + (1 if i < count % shards else 0) for i in range(shards)]
+
+    tasks = [
+        asyncio.ensure_future(
+            request_quiz_shard(topic, difficulty, size, part=i + 1, parts=shards)
+        )
+        for i, size in enumerate(sizes)
+    ]
+    try:
+        parts = await asyncio.gather(*tasks)
+    except BaseException:
+        # gather re-raises the first failure but leaves the sibling shards
+        # running; cancel them so a bad reply stops spending tokens and connections
+        for task in tasks:
+            task.cancel()
+        raise
+
+    questions: List[QuizQuestion] = []
+    seen: set[str] = set()
+    for part in parts:
+        add_unique_questions(questions, part.questions, seen)
+
+    missing = count - len(questions)
+    if missing > 0:
+        extra = await request_quiz_shard(
+            topic, difficulty, missing, avoid=[q.question for q in questions]
+        )
+        add_unique_questions(questions, extra.questions, seen)
+
+    if len(questions) != count:
+        raise ValueError(f"Expected {count} distinct questions but got {len(questions)}.")
+
+    return QuizResponse(
+        topic=parts[0].topic,
+        difficulty=parts[0].difficulty,
+        questions=questions,
+    )
+
+
+async def generate_and_cache(
+    key: tuple[str, str, int], topic: str, difficulty: Difficulty, count: int
+) -> QuizResponse:
+    quiz = await generate_quiz_questions(topic, difficulty, count)
+    quiz_cache_put(key, quiz)
+    return quiz
+
+
+async def call_openai_quiz(topic: str, difficulty: Difficulty, count: int) -> QuizResponse:
+    """
+    Returns a quiz with freshly shuffled options.
+    When the cache is enabled, repeated requests are served from it and
+    identical requests already in flight wait for the same generation.
+    """
+    if QUIZ_CACHE_SIZE <= 0:
+        quiz = await generate_quiz_questions(topic, difficulty, count)
+    else:
+        key = quiz_cache_key(topic, difficulty, count)
+        quiz = quiz_cache_get(key)
+
+        if quiz is None:
+            task = _quiz_inflight.get(key)
+            if task is None:
+                task = asyncio.create_task(generate_and_cache(key, topic, difficulty, count))
+                _quiz_inflight[key] = task
+                task.add_done_callback(lambda _: _quiz_inflight.pop(key, None))
+            # shield: one caller disconnecting must not cancel the others' quiz
+            quiz = await asyncio.shield(task)
 
     shuffled_questions = [shuffle_question_options(q) for q in quiz.questions]
     return QuizResponse(
@@ -229,17 +524,38 @@ def call_openai_quiz(topic: str, difficulty: Difficulty, count: int) -> QuizResp
 # -----------------------------
 # API route
 # -----------------------------
-@app.post("/generate-quiz", response_model=QuizResponse)
-def generate_quiz(req: QuizRequest):
+# QuizResponse is already validated, so skip response_model re-validation and
+# jsonable_encoder; `responses` keeps the schema in the OpenAPI docs.
+@app.post("/generate-quiz", responses={200: {"model": QuizResponse}})
+async def generate_quiz(req: QuizRequest):
     topic = req.topic.strip()
     if not topic:
         raise HTTPException(status_code=400, detail="Topic cannot be empty.")
 
     try:
-        return call_openai_quiz(topic, req.difficulty, req.count)
+        quiz = await call_openai_quiz(topic, req.difficulty, req.count)
     except ValueError as e:
         # Usually JSON/schema issues from the LLM
         raise HTTPException(status_code=502, detail=str(e))
-    except Exception as e:
-        # Any other backend issue
+    except RuntimeError as e:
+        # OpenAI unreachable or not configured; anything else is a real bug
+        # and is left to FastAPI's default 500 handler
         raise HTTPException(status_code=500, detail=f"Backend error: {e}")
+
+    # pydantic-core writes the JSON straight from the model, no intermediate dict
+    return Response(content=quiz.model_dump_json(), media_type="application/json")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # loop="auto" picks uvloop where installed and falls back to asyncio on Windows
+    uvicorn.run(
+        "main:app",
+        host="127.0.0.1",
+        port=8000,
+        loop="auto",
+        http="httptools",
+        # One worker by default: more split the quiz cache and OpenAI pool N ways
+        workers=int(os.getenv("UVICORN_WORKERS", "1")),
+    )
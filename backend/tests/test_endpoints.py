@@ -1,23 +1,39 @@
+import asyncio
+import json
 import sys
+from collections import OrderedDict
 from pathlib import Path
+from types import SimpleNamespace
 
+import httpx
+import pytest
 from fastapi.testclient import TestClient
 
 ROOT = Path(__file__).resolve().parents[2]
 sys.path.insert(0, str(ROOT))
 
-from backend.main import QuizQuestion, QuizResponse, app  # noqa: E402
+from backend.main import (  # noqa: E402
+    JsonObjectScanner,
+    QuizQuestion,
+    QuizResponse,
+    app,
+    call_openai_quiz,
+    request_quiz_shard,
+    shuffle_question_options,
+)
 
 client = TestClient(app)
 
 
-def build_sample_quiz(topic: str, difficulty: str, count: int) -> QuizResponse:
+def build_sample_quiz(
+    topic: str, difficulty: str, count: int, prefix: str = "Sample question"
+) -> QuizResponse:
     questions = []
     for i in range(count):
         options = [f"Option {idx}" for idx in range(1, 5)]
         questions.append(
             QuizQuestion(
-                question=f"Sample question {i+1}",
+                question=f"{prefix} {i+1}",
                 options=options,
                 answer_index=i % 4,
                 explanation="Sample explanation.",
@@ -37,7 +53,7 @@ def test_health_endpoint():
 
 
 def test_generate_quiz_endpoint(monkeypatch):
-    def fake_call_openai_quiz(topic: str, difficulty: str, count: int) -> QuizResponse:
+    async def fake_call_openai_quiz(topic: str, difficulty: str, count: int) -> QuizResponse:
         return build_sample_quiz(topic, difficulty, count)
 
     monkeypatch.setattr("backend.main.call_openai_quiz", fake_call_openai_quiz)
@@ -58,3 +74,214 @@ def test_generate_quiz_endpoint(monkeypatch):
         answer_index = question["answer_index"]
         assert isinstance(answer_index, int)
         assert 0 <= answer_index <= 3
+
+
+@pytest.fixture
+def fake_shards(monkeypatch):
+    """
+    Points call_openai_quiz at a fake request_quiz_shard with an empty cache.
+    Tests swap `fake_shards.reply` for custom behaviour; every call is recorded
+    in `fake_shards.calls`.
+    """
+
+    async def default_reply(topic, difficulty, count, part, parts, avoid):
+        return build_sample_quiz(topic, difficulty, count, prefix=f"Part {part} of {parts} question")
+
+    state = SimpleNamespace(calls=[], reply=default_reply)
+
+    async def fake_request_quiz_shard(topic, difficulty, count, part=1, parts=1, avoid=()):
+        state.calls.append(SimpleNamespace(count=count, part=part, parts=parts, avoid=list(avoid)))
+        return await state.reply(topic, difficulty, count, part, parts, avoid)
+
+    monkeypatch.setattr("backend.main._client", object())
+    monkeypatch.setattr("backend.main.request_quiz_shard", fake_request_quiz_shard)
+    monkeypatch.setattr("backend.main._quiz_cache", OrderedDict())
+    monkeypatch.setattr("backend.main._quiz_inflight", {})
+    return state
+
+
+def test_call_openai_quiz_shards_large_quizzes(fake_shards):
+    quiz = asyncio.run(call_openai_quiz("space exploration", "hard", 15))
+    assert sorted((c.count for c in fake_shards.calls), reverse=True) == [4, 4, 4, 3]
+    assert len(quiz.questions) == 15
+    assert len({q.question for q in quiz.questions}) == 15
+
+
+def test_call_openai_quiz_replaces_duplicate_questions(fake_shards):
+    async def same_questions(topic, difficulty, count, part, parts, avoid):
+        if avoid:
+            # Follow-up call for replacements
+            return build_sample_quiz(topic, difficulty, count, prefix="Replacement question")
+        # Every shard answers with the same questions
+        return build_sample_quiz(topic, difficulty, count)
+
+    fake_shards.reply = same_questions
+
+    quiz = asyncio.run(call_openai_quiz("ocean currents", "medium", 8))
+    texts = [q.question for q in quiz.questions]
+    assert len(texts) == 8
+    assert len(set(texts)) == 8
+    assert fake_shards.calls[-1].avoid == [f"Sample question {i}" for i in range(1, 5)]
+
+
+def test_call_openai_quiz_reuses_cached_quiz(fake_shards, monkeypatch):
+    monkeypatch.setattr("backend.main.QUIZ_CACHE_SIZE", 512)
+
+    first = asyncio.run(call_openai_quiz("Photosynthesis", "easy", 3))
+    second = asyncio.run(call_openai_quiz(" photosynthesis ", "easy", 3))
+    assert len(fake_shards.calls) == 1
+
+    for a, b in zip(first.questions, second.questions):
+        assert a.question == b.question
+        assert a.options[a.answer_index] == b.options[b.answer_index]
+
+
+def test_call_openai_quiz_cache_is_off_by_default_and_expires(fake_shards, monkeypatch):
+    asyncio.run(call_openai_quiz("tides", "easy", 2))
+    asyncio.run(call_openai_quiz("tides", "easy", 2))
+    assert len(fake_shards.calls) == 2
+
+    monkeypatch.setattr("backend.main.QUIZ_CACHE_SIZE", 512)
+    monkeypatch.setattr("backend.main.QUIZ_CACHE_TTL", 0)
+    asyncio.run(call_openai_quiz("tides", "easy", 2))
+    asyncio.run(call_openai_quiz("tides", "easy", 2))
+    assert len(fake_shards.calls) == 4
+
+
+def test_call_openai_quiz_coalesces_concurrent_misses(fake_shards, monkeypatch):
+    async def slow_reply(topic, difficulty, count, part, parts, avoid):
+        await asyncio.sleep(0.01)
+        return build_sample_quiz(topic, difficulty, count)
+
+    fake_shards.reply = slow_reply
+    monkeypatch.setattr("backend.main.QUIZ_CACHE_SIZE", 512)
+
+    async def ask_twice():
+        return await asyncio.gather(
+            call_openai_quiz("tides", "easy", 2), call_openai_quiz("Tides", "easy", 2)
+        )
+
+    first, second = asyncio.run(ask_twice())
+    assert len(fake_shards.calls) == 1
+    assert [q.question for q in first.questions] == [q.question for q in second.questions]
+
+
+def test_call_openai_quiz_cancels_shards_after_failure(fake_shards):
+    cancelled = []
+
+    async def fail_first(topic, difficulty, count, part, parts, avoid):
+        if part == 1:
+            await asyncio.sleep(0)  # let the sibling shards start first
+            raise ValueError("AI returned invalid JSON")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(part)
+            raise
+
+    fake_shards.reply = fail_first
+
+    async def run():
+        with pytest.raises(ValueError, match="invalid JSON"):
+            await call_openai_quiz("glaciers", "easy", 12)
+        await asyncio.sleep(0)  # deliver the cancellations
+        # Checked while the loop is alive: asyncio.run() would cancel leftovers anyway
+        return sorted(cancelled)
+
+    assert asyncio.run(run()) == [2, 3]
+
+
+def test_shuffle_question_options_tracks_correct_answer():
+    question = QuizQuestion(
+        question="Which planet is known as the red planet?",
+        options=["Venus", "Mars", "Jupiter", "Saturn"],
+        answer_index=1,
+        explanation="Iron oxide gives Mars its red color.",
+    )
+    for _ in range(50):
+        shuffled = shuffle_question_options(question)
+        assert sorted(shuffled.options) == sorted(question.options)
+        assert shuffled.options[shuffled.answer_index] == "Mars"
+
+
+class FakeStream:
+    def __init__(self, content: str, chunk_size: int = 7):
+        self.chunks = [content[i : i + chunk_size] for i in range(0, len(content), chunk_size)]
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for text in self.chunks:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    async def close(self):
+        self.closed = True
+
+
+def fake_openai_client(content: str) -> SimpleNamespace:
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        return FakeStream(content)
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def test_request_quiz_shard_parses_ai_reply(monkeypatch):
+    quiz = build_sample_quiz("volcanoes", "medium", 2)
+    monkeypatch.setattr("backend.main._client", fake_openai_client(quiz.model_dump_json()))
+
+    result = asyncio.run(request_quiz_shard("volcanoes", "medium", 2))
+    assert result.model_dump() == quiz.model_dump()
+
+
+def test_json_object_scanner_ignores_braces_in_strings():
+    text = '{"a": "closing } brace, quote \\" and {", "b": {"c": "\\\\"}} trailing'
+    scanner = JsonObjectScanner()
+    ends = [scanner.feed(text[i : i + 3]) for i in range(0, len(text), 3)]
+
+    done = next(i for i, end in enumerate(ends) if end >= 0)
+    assert done * 3 + ends[done] == text.index("}} trailing") + 2
+
+
+def test_request_quiz_shard_rejects_bad_schema(monkeypatch):
+    data = build_sample_quiz("volcanoes", "medium", 1).model_dump()
+    data["questions"][0]["options"].append("Option 5")
+    monkeypatch.setattr("backend.main._client", fake_openai_client(json.dumps(data)))
+
+    with pytest.raises(ValueError, match="did not match schema"):
+        asyncio.run(request_quiz_shard("volcanoes", "medium", 1))
+
+
+def test_request_quiz_shard_rejects_invalid_json(monkeypatch):
+    monkeypatch.setattr("backend.main._client", fake_openai_client('{"topic": "volcanoes", '))
+
+    with pytest.raises(ValueError, match="invalid JSON"):
+        asyncio.run(request_quiz_shard("volcanoes", "medium", 1))
+
+
+def test_request_quiz_shard_wraps_transport_errors(monkeypatch):
+    async def create(**kwargs):
+        raise httpx.ConnectError("connection refused")
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr("backend.main._client", fake_client)
+
+    with pytest.raises(RuntimeError, match="OpenAI request failed"):
+        asyncio.run(request_quiz_shard("volcanoes", "medium", 1))
+
+
+def test_cors_preflight_is_cacheable():
+    response = client.options(
+        "/generate-quiz",
+        headers={
+            "Origin": "http://127.0.0.1:5500",
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "content-type",
+        },
+    )
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == "*"
+    assert response.headers["access-control-max-age"] == "86400"
+    assert "access-control-allow-credentials" not in response.headers